@@ -57,7 +57,16 @@ def build_parser(parser_ctor=argparse.ArgumentParser):
     parser.add_argument(
         "--model-dir",
         help="Path to load the colorization model from. "
-        "If no model is found, the model will be downloaded (default: current dir)",
+        "If no model is found, the model will be downloaded. "
+        "If the directory also contains the model in the OpenVINO IR format "
+        "(colorization_release_v2.xml and .bin), it is used instead of the Caffe model "
+        "(default: current dir)",
+    )
+    parser.add_argument(
+        "--emit-tar",
+        action="store_true",
+        help="Pack the generated images into .tar archives of up to 1000 images each, "
+        "instead of saving them as separate files",
     )
     parser.add_argument(
         "--overwrite", action="store_true", help="Overwrite existing files in the save directory"
@@ -87,7 +96,11 @@ def generate_command(args):
 
     if args.type == "image":
         FractalImageGenerator(
-            count=args.count, output_dir=output_dir, shape=args.shape, model_path=args.model_dir
+            count=args.count,
+            output_dir=output_dir,
+            shape=args.shape,
+            model_path=args.model_dir,
+            emit_tar=args.emit_tar,
         ).generate_dataset()
     else:
         raise NotImplementedError(f"Data type: {args.type} is not supported")
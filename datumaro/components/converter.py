@@ -6,9 +6,12 @@ import logging as log
 import os
 import os.path as osp
 import shutil
+import sys
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import mkdtemp
-from typing import NoReturn, Optional, Tuple, TypeVar, Union
+from typing import Iterable, NoReturn, Optional, Tuple, TypeVar, Union
 
 import attr
 from attrs import define, field
@@ -24,7 +27,7 @@ from datumaro.components.extractor import DatasetItem, IExtractor
 from datumaro.components.media import Image, PointCloud
 from datumaro.components.progress_reporting import NullProgressReporter, ProgressReporter
 from datumaro.util.meta_file_util import save_meta_file
-from datumaro.util.os_util import rmtree
+from datumaro.util.os_util import copyfile, fast_rmtree, rmtree
 from datumaro.util.scope import on_error_do, scoped
 
 T = TypeVar("T")
@@ -151,11 +154,13 @@ class Converter(CliPlugin):
 
         tmpdir = mkdtemp(dir=osp.dirname(save_dir), prefix=osp.basename(save_dir), suffix=".tmp")
         on_error_do(rmtree, tmpdir, ignore_errors=True)
-        shutil.copymode(save_dir, tmpdir)
+        if sys.platform != "win32":
+            # Only the readonly flag can be copied on Windows
+            shutil.copymode(save_dir, tmpdir)
 
         retval = cls.convert(dataset, tmpdir, **options)
 
-        rmtree(save_dir)
+        fast_rmtree(save_dir)
         os.replace(tmpdir, save_dir)
 
         return retval
@@ -173,6 +178,7 @@ class Converter(CliPlugin):
         image_ext: Optional[str] = None,
         default_image_ext: Optional[str] = None,
         save_dataset_meta: bool = False,
+        save_images_workers: Optional[int] = None,
         ctx: Optional[ExportContext] = None,
     ):
         default_image_ext = default_image_ext or self.DEFAULT_IMAGE_EXT
@@ -199,9 +205,14 @@ class Converter(CliPlugin):
 
         self._extractor = extractor
         self._save_dir = save_dir
+        self._save_dir_abs = osp.abspath(save_dir)
 
         self._save_dataset_meta = save_dataset_meta
 
+        if save_images_workers is not None and save_images_workers < 1:
+            raise DatasetExportError("'save_images_workers' must be a positive number")
+        self._save_images_workers = save_images_workers
+
         # TODO: refactor this variable.
         # Can be used by a subclass to store the current patch info
         from datumaro.components.dataset import DatasetPatch
@@ -234,6 +245,20 @@ class Converter(CliPlugin):
     def _make_pcd_filename(self, item, *, name=None, subdir=None):
         return self._make_item_filename(item, name=name, subdir=subdir) + ".pcd"
 
+    def _make_abs_path(self, path: str) -> str:
+        # Avoid getcwd() calls in abspath() for the paths inside the save dir
+        if osp.isabs(path):
+            return osp.normpath(path)
+
+        save_dir = self._save_dir
+        if save_dir and path.startswith(save_dir):
+            seps = (osp.sep, osp.altsep) if osp.altsep else (osp.sep,)
+            subpath = path[len(save_dir) :]
+            if not subpath or subpath.startswith(seps) or save_dir.endswith(seps):
+                return osp.normpath(osp.join(self._save_dir_abs, subpath.lstrip("".join(seps))))
+
+        return osp.abspath(path)
+
     def _save_image(self, item, path=None, *, name=None, subdir=None, basedir=None):
         assert not (
             (subdir or name or basedir) and path
@@ -243,12 +268,62 @@ class Converter(CliPlugin):
             log.warning("Item '%s' has no image", item.id)
             return
 
-        basedir = basedir or self._save_dir
-        path = path or osp.join(basedir, self._make_image_filename(item, name=name, subdir=subdir))
-        path = osp.abspath(path)
+        if not path:
+            path = osp.join(
+                basedir or self._save_dir_abs,
+                self._make_image_filename(item, name=name, subdir=subdir),
+            )
+        path = self._make_abs_path(path)
 
         item.media.save(path)
 
+    def _save_images_parallel(
+        self, items: Iterable[DatasetItem], max_workers: Optional[int] = None, **kwargs
+    ) -> None:
+        """
+        Saves images of the items, optionally using several threads.
+        The extra arguments are passed to _save_image() for each item.
+
+        Image encoding and writing release the GIL, so saving in threads
+        scales with the number of cores. Errors are reported from
+        the calling thread.
+        """
+
+        max_workers = max_workers or self._save_images_workers
+
+        if not max_workers or max_workers == 1:
+            for item in items:
+                try:
+                    self._save_image(item, **kwargs)
+                except Exception as e:
+                    self._ctx.error_policy.report_item_error(e, item_id=(item.id, item.subset))
+            return
+
+        def _report_oldest_error():
+            # The errors are reported in the item order, as in the serial case
+            future, item = pending.popleft()
+            e = future.exception()
+            if e is not None:
+                self._ctx.error_policy.report_item_error(e, item_id=(item.id, item.subset))
+
+        # Keep a limited number of pending items to avoid holding
+        # the images of the whole dataset in memory
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for item in items:
+                    if 2 * max_workers <= len(pending):
+                        _report_oldest_error()
+
+                    pending.append((executor.submit(self._save_image, item, **kwargs), item))
+
+                while pending:
+                    _report_oldest_error()
+            except BaseException:
+                for future, _ in pending:
+                    future.cancel()
+                raise
+
     def _save_point_cloud(self, item=None, path=None, *, name=None, subdir=None, basedir=None):
         assert not (
             (subdir or name or basedir) and path
@@ -258,14 +333,17 @@ class Converter(CliPlugin):
             log.warning("Item '%s' has no pcd", item.id)
             return
 
-        basedir = basedir or self._save_dir
-        path = path or osp.join(basedir, self._make_pcd_filename(item, name=name, subdir=subdir))
-        path = osp.abspath(path)
+        if not path:
+            path = osp.join(
+                basedir or self._save_dir_abs,
+                self._make_pcd_filename(item, name=name, subdir=subdir),
+            )
+        path = self._make_abs_path(path)
 
         os.makedirs(osp.dirname(path), exist_ok=True)
         if item.media and osp.isfile(item.media.path):
             if item.media.path != path:
-                shutil.copyfile(item.media.path, path)
+                copyfile(item.media.path, path)
 
     def _save_meta_file(self, path):
         save_meta_file(path, self._extractor.categories())
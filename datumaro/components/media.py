@@ -6,7 +6,6 @@ from __future__ import annotations
 
 import os
 import os.path as osp
-import shutil
 import weakref
 from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
@@ -14,6 +13,7 @@ import cv2
 import numpy as np
 
 from datumaro.util.image import _image_loading_errors, decode_image, lazy_image, save_image
+from datumaro.util.os_util import copyfile
 
 
 class MediaElement:
@@ -158,7 +158,7 @@ class Image(MediaElement):
         os.makedirs(osp.dirname(path), exist_ok=True)
         if cur_ext == new_ext and osp.isfile(cur_path):
             if cur_path != path:
-                shutil.copyfile(cur_path, path)
+                copyfile(cur_path, path)
         else:
             save_image(path, self.data, jpeg_quality=95)
 
@@ -221,7 +221,7 @@ class ByteImage(Image):
         os.makedirs(osp.dirname(path), exist_ok=True)
         if cur_ext == new_ext and osp.isfile(cur_path):
             if cur_path != path:
-                shutil.copyfile(cur_path, path)
+                copyfile(cur_path, path)
         elif cur_ext == new_ext:
             with open(path, "wb") as f:
                 f.write(self.get_bytes())
@@ -47,11 +47,26 @@ class ImageDirExtractor(SourceExtractor):
 class ImageDirConverter(Converter):
     DEFAULT_IMAGE_EXT = ".jpg"
 
+    @classmethod
+    def build_cmdline_parser(cls, **kwargs):
+        parser = super().build_cmdline_parser(**kwargs)
+        parser.add_argument(
+            "--num-workers",
+            dest="save_images_workers",
+            type=int,
+            default=None,
+            help="The number of threads used to save images (default: save in the main thread)",
+        )
+        return parser
+
     def apply(self):
         os.makedirs(self._save_dir, exist_ok=True)
 
-        for item in self._extractor:
-            if item.media:
-                self._save_image(item)
-            else:
-                log.debug("Item '%s' has no image info", item.id)
+        def _get_items_with_media():
+            for item in self._extractor:
+                if item.media:
+                    yield item
+                else:
+                    log.debug("Item '%s' has no image info", item.id)
+
+        self._save_images_parallel(_get_items_with_media())
@@ -6,20 +6,45 @@ import hashlib
 import logging as log
 import os
 import os.path as osp
+import sys
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from importlib.resources import open_text
+from io import BytesIO
 from multiprocessing import get_context
+from multiprocessing.sharedctypes import Synchronized
+from multiprocessing.util import Finalize
+from queue import Queue
 from random import Random
-from typing import List, Optional, Tuple
+from threading import Thread, active_count
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import cv2 as cv
 import numpy as np
 import requests
 
 from datumaro.components.dataset_generator import DatasetGenerator
-from datumaro.util.image import save_image
+from datumaro.util.image import encode_image
 from datumaro.util.scope import on_error_do, on_exit_do, scope_add, scoped
 
-from .utils import IFSFunction, augment, colorize, suppress_computation_warnings
+from .utils import (
+    IFSFunction,
+    IFSParams,
+    augment_from_params,
+    colorize_batch,
+    draw_augment_params,
+    random_uniforms,
+    suppress_computation_warnings,
+)
+
+try:
+    # Available since Python 3.8
+    from multiprocessing.shared_memory import SharedMemory
+except ModuleNotFoundError:
+    SharedMemory = None
 
 
 class FractalImageGenerator(DatasetGenerator):
@@ -30,17 +55,31 @@ class FractalImageGenerator(DatasetGenerator):
 
     _MODEL_PROTO_FILENAME = "colorization_deploy_v2.prototxt"
     _MODEL_WEIGHTS_FILENAME = "colorization_release_v2.caffemodel"
+    _MODEL_IR_XML_FILENAME = "colorization_release_v2.xml"
+    _MODEL_IR_BIN_FILENAME = "colorization_release_v2.bin"
     _HULL_PTS_FILE_NAME = "pts_in_hull.npy"
     _COLORS_FILE = "background_colors.txt"
+    _COLORIZATION_BATCH_SIZE = 16
+    _TAR_SHARD_SIZE = 1000
+
+    # Faster than the default level, the files are just slightly bigger
+    _PNG_COMPRESSION = 1
 
     def __init__(
-        self, output_dir: str, count: int, shape: Tuple[int, int], model_path: Optional[str] = None
+        self,
+        output_dir: str,
+        count: int,
+        shape: Tuple[int, int],
+        model_path: Optional[str] = None,
+        emit_tar: bool = False,
     ) -> None:
         assert 0 < count, "Image count cannot be lesser than 1"
         self._count = count
 
         self._output_dir = output_dir
+        os.makedirs(self._output_dir, exist_ok=True)
         self._model_dir = model_path if model_path else os.getcwd()
+        self._emit_tar = emit_tar
 
         self._cpu_count = min(os.cpu_count(), self._count)
 
@@ -54,6 +93,7 @@ class FractalImageGenerator(DatasetGenerator):
 
         self._initialize_params()
 
+    @scoped
     def generate_dataset(self) -> None:
         log.info(
             "Generation of '%d' 3-channel images with height = '%d' and width = '%d'",
@@ -62,104 +102,179 @@ class FractalImageGenerator(DatasetGenerator):
             self._width,
         )
 
-        self._download_colorization_model(self._model_dir)
+        # The Caffe model is only downloaded when there is no IR model.
+        # The IR itself is loaded only in the workers, as the inference engine
+        # state can't be safely inherited by forked processes.
+        use_ir = self._has_colorization_model_ir(self._model_dir)
+        if not use_ir:
+            self._download_colorization_model(self._model_dir)
+
+        # The constant arrays are loaded once and shared with the workers
+        shared_arrays = None
+        if SharedMemory is not None:
+            arrays = {"background_colors": _load_background_colors()}
+            if not use_ir:
+                arrays["pts_in_hull"] = _load_hull_points(
+                    osp.join(self._model_dir, self._HULL_PTS_FILE_NAME)
+                )
 
-        mp_ctx = get_context("spawn")  # On Mac 10.15 and Python 3.7 fork leads to hangs
-        with mp_ctx.Pool(processes=self._cpu_count) as pool:
+            shared_arrays = {}
+            for name, array in arrays.items():
+                shm, shared_arrays[name] = _share_array(array)
+                on_exit_do(_release_shared_memory, shm)
+
+        # Each worker runs the model, so the OpenCV threads are limited
+        # to avoid oversubscription of the CPU cores
+        worker_threads = max(1, os.cpu_count() // self._cpu_count)
+
+        # The same worker processes are used for both stages to avoid repeated
+        # process startup and model loading
+        mp_ctx = self._get_mp_context()
+        with mp_ctx.Pool(
+            processes=self._cpu_count,
+            initializer=_init_worker,
+            initargs=(
+                self._model_dir,
+                shared_arrays,
+                worker_threads,
+                (self._COLORIZATION_BATCH_SIZE, self._height, self._width),
+                mp_ctx.Value("i", 0),
+            ),
+        ) as pool:
             params = pool.map(self._generate_category, [Random(i) for i in range(self._categories)])
 
-        instances_weights = np.repeat(self._weights, self._instances, axis=0)
-        weight_per_img = np.tile(instances_weights, (self._categories, 1))
-        params = np.array(params, dtype=object)
-        repeated_params = np.repeat(params, self._weights.shape[0] * self._instances, axis=0)
-        repeated_params = repeated_params[: self._count]
-        weight_per_img = weight_per_img[: self._count]
-        assert weight_per_img.shape[0] == len(repeated_params) == self._count
-
-        splits = min(self._cpu_count, self._count)
-        params_per_proc = np.array_split(repeated_params, splits)
-        weights_per_proc = np.array_split(weight_per_img, splits)
-
-        generation_params = []
-        offset = 0
-        for param, w in zip(params_per_proc, weights_per_proc):
-            indices = list(range(offset, offset + len(param)))
-            offset += len(param)
-            generation_params.append((param, w, indices))
-
-        with mp_ctx.Pool(processes=self._cpu_count) as pool:
-            pool.starmap(self._generate_image_batch, generation_params)
+            # The tasks are small and created lazily, so that the workers are
+            # loaded evenly, and the per-image data is not copied in advance
+            tasks = self._make_generation_tasks(params)
+            for _ in pool.imap_unordered(self._generate_image_batch_task, tasks):
+                pass
+
+            # Let the workers exit normally, so that they finish their .tar shards
+            pool.close()
+            pool.join()
+
+    def _make_generation_tasks(
+        self, params: List[IFSParams]
+    ) -> Iterator[Tuple[Dict[int, IFSParams], int, int]]:
+        # A task produces a single colorization batch.
+        # Only the categories of the task's images are passed to the worker.
+        images_per_category = self._weights.shape[0] * self._instances
+        task_size = self._COLORIZATION_BATCH_SIZE
+        for start in range(0, self._count, task_size):
+            stop = min(start + task_size, self._count)
+            categories = range(start // images_per_category, (stop - 1) // images_per_category + 1)
+            yield {c: params[c] for c in categories}, start, stop
+
+    def _generate_image_batch_task(self, task: Tuple[Dict[int, IFSParams], int, int]) -> None:
+        self._generate_image_batch(*task)
+
+    def _get_image_params(
+        self, params: Dict[int, IFSParams], idx: int
+    ) -> Tuple[IFSParams, np.ndarray]:
+        # The images of a category are split into groups of self._instances
+        # images, each group uses its own weights
+        category = idx // (self._weights.shape[0] * self._instances)
+        weight = self._weights[(idx // self._instances) % self._weights.shape[0]]
+        return params[category], weight
 
     @scoped
-    def _generate_image_batch(
-        self, params: np.ndarray, weights: np.ndarray, indices: List[int]
-    ) -> None:
+    def _generate_image_batch(self, params: Dict[int, IFSParams], start: int, stop: int) -> None:
+        _check_worker_state()
         scope_add(suppress_computation_warnings())
 
-        proto = osp.join(self._model_dir, self._MODEL_PROTO_FILENAME)
-        model = osp.join(self._model_dir, self._MODEL_WEIGHTS_FILENAME)
-        npy = osp.join(self._model_dir, self._HULL_PTS_FILE_NAME)
-        pts_in_hull = np.load(npy).transpose().reshape(2, 313, 1, 1).astype(np.float32)
+        # The model is loaded once per worker process by _init_worker()
+        net = _WORKER_STATE.net
+        background_colors = _WORKER_STATE.background_colors
 
-        with open_text(__package__, self._COLORS_FILE) as f:
-            background_colors = np.loadtxt(f)
+        if self._emit_tar:
+            write_file = _get_worker_tar_writer(self._output_dir, self._TAR_SHARD_SIZE).write
+        else:
+            write_file = self._write_image_file
 
-        net = cv.dnn.readNetFromCaffe(proto, model)
-        net.getLayer(net.getLayerId("class8_ab")).blobs = [pts_in_hull]
-        net.getLayer(net.getLayerId("conv8_313_rh")).blobs = [np.full([1, 313], 2.606, np.float32)]
+        # The encoded images are written in a background thread,
+        # so that writing overlaps with the generation of the next images
+        writer = scope_add(_AsyncFileWriter(write_file))
 
-        for i, param, w in zip(indices, params, weights):
-            image = self._generate_image(
-                Random(i),
-                param,
-                self._iterations,
-                self._height,
-                self._width,
-                draw_point=False,
-                weight=w,
-            )
-            color_image = colorize(image, net)
-            aug_image = augment(Random(i), color_image, background_colors)
-            save_image(
-                osp.join(self._output_dir, "{:06d}.png".format(i)), aug_image, create_dir=True
+        for batch_start in range(start, stop, self._COLORIZATION_BATCH_SIZE):
+            batch_indices = range(
+                batch_start, min(batch_start + self._COLORIZATION_BATCH_SIZE, stop)
             )
 
+            # The images are drawn into the preallocated buffers, they are
+            # only needed until the colorization is done
+            images = []
+            augment_params = []
+            for i, image_buffer in zip(batch_indices, _WORKER_STATE.image_buffers):
+                param, w = self._get_image_params(params, i)
+                augment_params.append(draw_augment_params(Random(i), len(background_colors)))
+                images.append(
+                    self._generate_image(
+                        Random(i),
+                        param,
+                        self._iterations,
+                        self._height,
+                        self._width,
+                        draw_point=False,
+                        weight=w,
+                        out=image_buffer,
+                    )
+                )
+            color_images = colorize_batch(images, net)
+
+            for i, color_image, aug_params in zip(batch_indices, color_images, augment_params):
+                aug_image = augment_from_params(color_image, background_colors, aug_params)
+                writer.write(
+                    "{:06d}.png".format(i),
+                    encode_image(aug_image, ".png", png_compression=self._PNG_COMPRESSION),
+                )
+
+    def _write_image_file(self, filename: str, data: bytes) -> None:
+        with open(osp.join(self._output_dir, filename), "wb") as f:
+            f.write(data)
+
     def _generate_image(
         self,
         rng: Random,
-        params: np.ndarray,
+        params: IFSParams,
         iterations: int,
         height: int,
         width: int,
         draw_point: bool = True,
         weight: Optional[np.ndarray] = None,
+        out: Optional[np.ndarray] = None,
     ) -> np.ndarray:
         ifs_function = IFSFunction(rng, prev_x=0.0, prev_y=0.0)
-        for param in params:
-            ifs_function.add_param(
-                param[: ifs_function.NUM_PARAMS], param[ifs_function.NUM_PARAMS], weight
-            )
+        ifs_function.set_params(params, weight)
         ifs_function.calculate(iterations)
-        img = ifs_function.draw(height, width, draw_point)
+        img = ifs_function.draw(height, width, draw_point, out=out)
         return img
 
     @scoped
-    def _generate_category(self, rng: Random, base_h: int = 512, base_w: int = 512) -> np.ndarray:
+    def _generate_category(self, rng: Random, base_h: int = 512, base_w: int = 512) -> IFSParams:
+        _check_worker_state()
         scope_add(suppress_computation_warnings())
 
         pixels = -1
         i = 0
         while pixels < self._threshold and i < self._iterations:
             param_size = rng.randint(2, 7)
-            params = np.zeros((param_size, IFSFunction.NUM_PARAMS + 1), dtype=np.float32)
 
+            # Same as rng.uniform(-1.0, 1.0) for each parameter, but vectorized
+            a, b, c, d, e, f = (
+                (-1.0 + 2.0 * random_uniforms(rng, param_size * IFSFunction.NUM_PARAMS))
+                .reshape(param_size, IFSFunction.NUM_PARAMS)
+                .T
+            )
+            transforms = np.array(IFSFunction.make_transform(a, b, c, d, e, f), dtype=np.float32)
+            transforms = np.ascontiguousarray(transforms.transpose(2, 0, 1))
+
+            probs = np.abs(a * d - b * c)
             sum_proba = 1e-5
-            for p_idx in range(param_size):
-                a, b, c, d, e, f = [rng.uniform(-1.0, 1.0) for _ in range(IFSFunction.NUM_PARAMS)]
-                prob = abs(a * d - b * c)
+            for prob in probs.tolist():  # keep the summation order
                 sum_proba += prob
-                params[p_idx] = a, b, c, d, e, f, prob
-            params[:, IFSFunction.NUM_PARAMS] /= sum_proba
+            probs = probs.astype(np.float32)
+            probs /= sum_proba
+            params = IFSParams(transforms, probs)
 
             fractal_img = self._generate_image(rng, params, self._num_of_points, base_h, base_w)
             pixels = np.count_nonzero(fractal_img) / (base_h * base_w)
@@ -175,6 +290,7 @@ class FractalImageGenerator(DatasetGenerator):
         self._categories = np.ceil(instances_categories / self._instances).astype(int)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _create_weights(num_params):
         # weights from https://openaccess.thecvf.com/content/ACCV2020/papers/Kataoka_Pre-training_without_Natural_Images_ACCV_2020_paper.pdf
         BASE_WEIGHTS = np.ones((num_params,))
@@ -190,23 +306,98 @@ class FractalImageGenerator(DatasetGenerator):
         weights = np.array(weight_vectors)
         return weights
 
+    @staticmethod
+    def _get_mp_context():
+        # Forked workers start faster, as they don't re-import the modules.
+        # The generator is still pickled with each task, but it is small.
+        # Forking a process with running threads can leave locks held by those
+        # threads acquired in the workers, so spawn is used in this case.
+        if sys.platform == "linux" and active_count() == 1:
+            return get_context("fork")
+
+        # Fork is not available on Windows, and on Mac 10.15 and Python 3.7 it leads to hangs
+        return get_context("spawn")
+
+    @classmethod
+    def _load_colorization_model(
+        cls,
+        model_dir: str,
+        pts_in_hull: Optional[np.ndarray] = None,
+        *,
+        report_fallback: bool = True,
+    ) -> cv.dnn.Net:
+        net = cls._load_colorization_model_ir(model_dir, report_fallback=report_fallback)
+        if net is not None:
+            return net
+
+        proto = osp.join(model_dir, cls._MODEL_PROTO_FILENAME)
+        model = osp.join(model_dir, cls._MODEL_WEIGHTS_FILENAME)
+        # The Caffe model is not downloaded when there is an IR model
+        has_caffe_model = osp.isfile(proto) and osp.isfile(model)
+        if not has_caffe_model and cls._has_colorization_model_ir(model_dir):
+            raise ValueError(
+                "Failed to load the OpenVINO colorization model from '%s', "
+                "and there is no Caffe model to fall back to. Remove the IR model files "
+                "from the directory to download the Caffe model" % model_dir
+            )
+
+        if pts_in_hull is None:
+            pts_in_hull = _load_hull_points(osp.join(model_dir, cls._HULL_PTS_FILE_NAME))
+
+        net = cv.dnn.readNetFromCaffe(proto, model)
+        net.setPreferableBackend(cv.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv.dnn.DNN_TARGET_CPU)
+        net.enableFusion(True)
+        net.getLayer(net.getLayerId("class8_ab")).blobs = [pts_in_hull]
+        net.getLayer(net.getLayerId("conv8_313_rh")).blobs = [np.full([1, 313], 2.606, np.float32)]
+        return net
+
+    @classmethod
+    def _load_colorization_model_ir(
+        cls, model_dir: str, *, report_fallback: bool = True
+    ) -> Optional[cv.dnn.Net]:
+        """
+        Loads the colorization model in the OpenVINO IR format, if it is available
+        in the model directory. The IR is expected to be converted from the Caffe model
+        with the cluster centers embedded, possibly in FP16 or quantized to INT8.
+        Requires OpenCV built with OpenVINO support.
+        """
+
+        if not cls._has_colorization_model_ir(model_dir):
+            return None
+
+        try:
+            net = cv.dnn.readNetFromModelOptimizer(
+                osp.join(model_dir, cls._MODEL_IR_XML_FILENAME),
+                osp.join(model_dir, cls._MODEL_IR_BIN_FILENAME),
+            )
+            net.setPreferableBackend(cv.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+            net.setPreferableTarget(cv.dnn.DNN_TARGET_CPU)
+        except cv.error as e:
+            log.log(
+                log.WARNING if report_fallback else log.DEBUG,
+                "Failed to load the OpenVINO colorization model from '%s', "
+                "falling back to the Caffe model: %s",
+                model_dir,
+                e,
+            )
+            return None
+
+        return net
+
+    @classmethod
+    def _has_colorization_model_ir(cls, model_dir: str) -> bool:
+        xml_path = osp.join(model_dir, cls._MODEL_IR_XML_FILENAME)
+        bin_path = osp.join(model_dir, cls._MODEL_IR_BIN_FILENAME)
+        return osp.isfile(xml_path) and osp.isfile(bin_path)
+
     @classmethod
     def _download_colorization_model(cls, save_dir: str) -> None:
         prototxt_file_name = cls._MODEL_PROTO_FILENAME
         caffemodel_file_name = cls._MODEL_WEIGHTS_FILENAME
         hull_file_name = cls._HULL_PTS_FILE_NAME
 
-        proto_path = osp.join(save_dir, prototxt_file_name)
-        model_path = osp.join(save_dir, caffemodel_file_name)
-        hull_path = osp.join(save_dir, hull_file_name)
-        if not (
-            osp.exists(proto_path) and osp.exists(model_path) and osp.exists(hull_path)
-        ) and not os.access(save_dir, os.W_OK):
-            raise ValueError(
-                "Please provide a path to a colorization model directory or "
-                "a path to a writable directory to download the model"
-            )
-
+        downloads = []
         for url, filename, size, sha512_checksum in [
             (
                 f"https://raw.githubusercontent.com/richzhang/colorization/a1642d6ac6fc80fe08885edba34c166da09465f6/colorization/models/{prototxt_file_name}",
@@ -229,30 +420,96 @@ class FractalImageGenerator(DatasetGenerator):
         ]:
             save_path = osp.join(save_dir, filename)
             if osp.exists(save_path):
-                continue
+                # A partially written file would only fail later, when the model is loaded.
+                # The hull points can be saved by other NumPy versions with a different
+                # header, so their contents are checked instead.
+                if filename == hull_file_name:
+                    is_valid = _check_hull_points_file(save_path)
+                else:
+                    is_valid = cls._check_file(
+                        save_path, expected_size=size, expected_checksum=sha512_checksum
+                    )
+                if is_valid:
+                    continue
+
+                log.warning(
+                    "The '%s' file in '%s' is incomplete or corrupted, "
+                    "it will be downloaded again",
+                    filename,
+                    save_dir,
+                )
+
+            downloads.append((url, filename, size, sha512_checksum))
 
+        if not downloads:
+            return
+
+        if not os.access(save_dir, os.W_OK):
+            raise ValueError(
+                "Please provide a path to a colorization model directory or "
+                "a path to a writable directory to download the model"
+            )
+
+        def _download(session, url, filename, size, sha512_checksum):
+            save_path = osp.join(save_dir, filename)
+
+            # The existing file is only replaced when the new one is downloaded
             log.info("Downloading the '%s' file to '%s'", filename, save_dir)
             try:
                 cls._download_file(
-                    url, save_path, expected_size=size, expected_checksum=sha512_checksum
+                    url,
+                    save_path,
+                    session=session,
+                    expected_size=size,
+                    expected_checksum=sha512_checksum,
                 )
             except Exception as e:
                 raise Exception(f"Failed to download the '{filename}' file: {str(e)}") from e
 
+        # The files are downloaded concurrently, reusing the connections where possible
+        with requests.Session() as session, ThreadPoolExecutor(
+            max_workers=len(downloads)
+        ) as executor:
+            # The files are binary, there is no need to compress them in transport
+            session.headers["Accept-Encoding"] = "identity"
+
+            futures = [executor.submit(_download, session, *args) for args in downloads]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _check_file(path: str, *, expected_size: int, expected_checksum: str) -> bool:
+        if osp.getsize(path) != expected_size:
+            return False
+
+        with open(path, "rb") as f:
+            if hasattr(hashlib, "file_digest"):  # Python 3.11+
+                checksum_counter = hashlib.file_digest(f, "sha512")
+            else:
+                checksum_counter = hashlib.sha512()
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    checksum_counter.update(chunk)
+
+        return checksum_counter.hexdigest().lower() == expected_checksum.lower()
+
     @staticmethod
     @scoped
     def _download_file(
-        url: str, output_path: str, *, timeout: int = 60, expected_size: int, expected_checksum: str
+        url: str,
+        output_path: str,
+        *,
+        session: Optional[requests.Session] = None,
+        timeout: int = 60,
+        expected_size: int,
+        expected_checksum: str,
     ) -> None:
         BLOCK_SIZE = 2**20
 
-        assert not osp.exists(output_path)
-
         tmp_path = output_path + ".tmp"
         if osp.exists(tmp_path):
             raise Exception(f"Can't write temporary file '{tmp_path}' - file exists")
 
-        response = requests.get(url, timeout=timeout, stream=True)
+        response = (session or requests).get(url, timeout=timeout, stream=True)
         on_exit_do(response.close)
 
         response.raise_for_status()
@@ -280,4 +537,221 @@ class FractalImageGenerator(DatasetGenerator):
         if actual_checksum.lower() != expected_checksum.lower():
             raise Exception("The downloaded file has unexpected checksum")
 
-        os.rename(tmp_path, output_path)
+        # Replaces the existing file, if any
+        os.replace(tmp_path, output_path)
+
+
+# Resources of an image generation worker process, initialized by _init_worker()
+_WORKER_STATE = SimpleNamespace(
+    worker_id=None,
+    net=None,
+    background_colors=None,
+    shared_memory=[],
+    image_buffers=None,
+    tar_writer=None,
+    init_error=None,
+)
+
+# name, shape, dtype
+_SharedArrayInfo = Tuple[str, Tuple[int, ...], str]
+
+
+def _init_worker(*args) -> None:
+    # If the initializer raises, the pool keeps restarting the worker process,
+    # so the error is reported to the parent from the first task instead
+    try:
+        _init_worker_state(*args)
+    except Exception as e:
+        _WORKER_STATE.init_error = e
+
+
+def _check_worker_state() -> None:
+    if _WORKER_STATE.init_error is not None:
+        raise _WORKER_STATE.init_error
+
+
+def _init_worker_state(
+    model_dir: str,
+    shared_arrays: Optional[Dict[str, _SharedArrayInfo]],
+    num_threads: int,
+    image_buffers_shape: Tuple[int, int, int],
+    worker_counter: Synchronized,
+) -> None:
+    with worker_counter.get_lock():
+        _WORKER_STATE.worker_id = worker_counter.value
+        worker_counter.value += 1
+
+    # The initializer is only called in the worker processes,
+    # so the parent's settings are not affected
+    cv.setNumThreads(num_threads)
+
+    pts_in_hull = None
+    background_colors = None
+    if shared_arrays:
+        if "pts_in_hull" in shared_arrays:
+            pts_in_hull = _attach_shared_array(shared_arrays["pts_in_hull"])
+        background_colors = _attach_shared_array(shared_arrays["background_colors"])
+    else:
+        background_colors = _load_background_colors()
+
+    # The colorization model is heavy, so it is loaded only once per worker process.
+    # The workers load the same model, so only one of them reports the IR fallback.
+    _WORKER_STATE.net = FractalImageGenerator._load_colorization_model(
+        model_dir, pts_in_hull=pts_in_hull, report_fallback=_WORKER_STATE.worker_id == 0
+    )
+
+    _WORKER_STATE.background_colors = background_colors
+
+    # (batch size, height, width) buffers for the generated grayscale images
+    _WORKER_STATE.image_buffers = np.zeros(image_buffers_shape, dtype=np.uint8)
+
+
+def _get_worker_tar_writer(output_dir: str, shard_size: int) -> "_TarShardWriter":
+    # Each worker appends the images of its tasks to its own sequence of shards
+    if _WORKER_STATE.tar_writer is None:
+        _WORKER_STATE.tar_writer = _TarShardWriter(
+            output_dir, shard_size, name_prefix="shard-{:04d}".format(_WORKER_STATE.worker_id)
+        )
+
+        # Called when the worker process exits normally
+        Finalize(_WORKER_STATE.tar_writer, _WORKER_STATE.tar_writer.close, exitpriority=10)
+
+    return _WORKER_STATE.tar_writer
+
+
+def _share_array(array: np.ndarray) -> Tuple[SharedMemory, _SharedArrayInfo]:
+    shm = SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_shared_array(info: _SharedArrayInfo) -> np.ndarray:
+    name, shape, dtype = info
+    shm = SharedMemory(name=name)
+
+    # The memory must stay mapped while the array is used
+    _WORKER_STATE.shared_memory.append(shm)
+
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _release_shared_memory(shm: SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+
+# The arrays below are loaded once per process and shared, they must not be modified
+@lru_cache(maxsize=None)
+def _load_hull_points(path: str) -> np.ndarray:
+    return np.load(path).transpose().reshape(2, 313, 1, 1).astype(np.float32)
+
+
+def _check_hull_points_file(path: str) -> bool:
+    try:
+        points = np.load(path)
+    except (OSError, ValueError, EOFError):
+        return False
+
+    return points.shape == (313, 2) and np.issubdtype(points.dtype, np.number)
+
+
+@lru_cache(maxsize=None)
+def _load_background_colors() -> np.ndarray:
+    with open_text(__package__, FractalImageGenerator._COLORS_FILE) as f:
+        return np.loadtxt(f)
+
+
+class _AsyncFileWriter:
+    """
+    Calls 'write_file(filename, data)' for the files in a background thread.
+    Up to 'max_pending' files can wait in the queue, then write() blocks.
+    The errors of the background thread are raised in the next write() or close().
+    """
+
+    _STOP = object()
+
+    def __init__(self, write_file: Callable[[str, bytes], None], max_pending: int = 4) -> None:
+        self._write_file = write_file
+        self._queue = Queue(maxsize=max_pending)
+        self._error = None
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+
+            # Keep consuming the queue after an error to not block the producer
+            if self._error is None:
+                try:
+                    self._write_file(*item)
+                except BaseException as e:
+                    self._error = e
+
+    def write(self, filename: str, data: bytes) -> None:
+        if self._error is not None:
+            self.close()
+
+        self._queue.put((filename, data))
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _TarShardWriter:
+    """
+    Writes files into a sequence of .tar archives with up to 'shard_size' files each.
+    The archives are named '<name_prefix>-<archive index>.tar'.
+    """
+
+    def __init__(self, output_dir: str, shard_size: int, *, name_prefix: str = "shard") -> None:
+        self._output_dir = output_dir
+        self._shard_size = shard_size
+        self._name_prefix = name_prefix
+        self._shard = None
+        self._shard_idx = 0
+        self._shard_files = 0
+
+    def write(self, filename: str, data: bytes) -> None:
+        if self._shard is None or self._shard_size <= self._shard_files:
+            self.close()
+
+            shard_path = osp.join(
+                self._output_dir, "{}-{:04d}.tar".format(self._name_prefix, self._shard_idx)
+            )
+            self._shard = tarfile.open(shard_path, "w|", bufsize=2**20)
+            self._shard_idx += 1
+            self._shard_files = 0
+
+        info = tarfile.TarInfo(filename)
+        info.size = len(data)
+        info.mtime = time.time()
+        self._shard.addfile(info, BytesIO(data))
+        self._shard_files += 1
+
+    def close(self) -> None:
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -3,49 +3,199 @@
 # SPDX-License-Identifier: MIT
 
 import warnings
+from bisect import bisect_left
 from contextlib import contextmanager
 from random import Random
-from typing import ContextManager
+from typing import Callable, ContextManager, List, Optional, Tuple
 
 import cv2 as cv
 import numpy as np
+from attr import attrs, field
+
+try:
+    # Numba is optional. Without it, the kernels below are replaced
+    # with the equivalent Python and NumPy implementations
+    from numba import njit
+except ModuleNotFoundError:
+    njit = None
+
+
+def _sample_with_numpy(rng: Random, sample: Callable[[np.random.RandomState], np.ndarray]):
+    # Random and np.random.RandomState use the same MT19937 generator,
+    # so the state can be shared
+    version, internal_state, gauss_next = rng.getstate()
+    np_rng = np.random.RandomState()
+    np_rng.set_state(
+        ("MT19937", np.array(internal_state[:-1], dtype=np.uint32), internal_state[-1])
+    )
+    values = sample(np_rng)
+
+    _, keys, pos = np_rng.get_state()[:3]
+    rng.setstate((version, tuple(keys.tolist()) + (pos,), gauss_next))
+    return values
+
+
+def random_uniforms(rng: Random, size: int) -> np.ndarray:
+    """
+    Returns 'size' values as if they were produced by 'size' calls of rng.random(),
+    and advances the rng state accordingly.
+    """
+
+    # Both use the same algorithm to produce floats
+    return _sample_with_numpy(rng, lambda np_rng: np_rng.random_sample(size))
+
+
+def random_words(rng: Random, size: int) -> np.ndarray:
+    """
+    Returns 'size' uint32 values as if they were produced by 'size' calls of
+    rng.getrandbits(32), and advances the rng state accordingly.
+    """
+
+    # In this range, each value is a single raw generator output
+    return _sample_with_numpy(
+        rng, lambda np_rng: np_rng.randint(0, 2**32, size=size, dtype=np.uint32)
+    )
+
+
+def _ifs_iterate_loop(transforms, cum_proba, rands, start_x, start_y):
+    xs = np.empty(len(rands), dtype=np.float64)
+    ys = np.empty(len(rands), dtype=np.float64)
+
+    prev_x, prev_y = start_x, start_y
+    for i, rand in enumerate(rands):
+        func_idx = np.searchsorted(cum_proba, rand)
+        if func_idx < len(cum_proba):
+            t = transforms[func_idx]
+            prev_x, prev_y = (
+                prev_x * t[0, 0] + prev_y * t[0, 1] + t[0, 2],
+                prev_x * t[1, 0] + prev_y * t[1, 1] + t[1, 2],
+            )
+
+        xs[i] = prev_x
+        ys[i] = prev_y
+
+    return xs, ys
+
+
+def _ifs_iterate_py(transforms, cum_proba, rands, start_x, start_y):
+    # Python floats and lists are much faster than NumPy scalars in a loop.
+    # The computations are done in the same order with the same float64 values.
+    transforms = [tuple(t[0] + t[1]) for t in transforms.tolist()]
+    cum_proba = cum_proba.tolist()
+    num_funcs = len(cum_proba)
+
+    xs = []
+    ys = []
+    prev_x, prev_y = start_x, start_y
+    for rand in rands.tolist():
+        func_idx = bisect_left(cum_proba, rand)  # same as np.searchsorted()
+        if func_idx < num_funcs:
+            a, b, e, c, d, f = transforms[func_idx]
+            prev_x, prev_y = prev_x * a + prev_y * b + e, prev_x * c + prev_y * d + f
+
+        xs.append(prev_x)
+        ys.append(prev_y)
+
+    return np.array(xs, dtype=np.float64), np.array(ys, dtype=np.float64)
+
+
+if njit is not None:
+    _ifs_iterate = njit(cache=True)(_ifs_iterate_loop)
+else:
+    _ifs_iterate = _ifs_iterate_py
+
+
+@attrs(slots=True, eq=False)
+class IFSParams:
+    # (N, 2, 3) float32 array of affine transforms, see IFSFunction.make_transform()
+    transforms: np.ndarray = field()
+
+    # (N, ) float32 array of transform selection probabilities
+    probs: np.ndarray = field()
+
+
+def _draw_patches_loop(image, xs, ys, words, start):
+    # Draws the points from 'start' as 3x3 patches with random masks,
+    # a mask is obtained from a word in the same way as Random.randint(1, 511) does.
+    # Returns the index of the next point to draw
+    i = start
+    for word in words:
+        mask = word >> 23
+        if mask == 511:
+            continue  # rejected
+        mask += 1
+
+        x = xs[i] + 1
+        y = ys[i] + 1
+        if image.shape[0] < x + 3 or image.shape[1] < y + 3:
+            raise IndexError("The point is out of the image")
+
+        for r in range(3):
+            for c in range(3):
+                image[x + r, y + c] = 127 * ((mask >> (8 - 3 * r - c)) & 1)
+        i += 1
+
+    return i
+
+
+def _draw_patches_np(image, xs, ys, words, start):
+    # The same as _draw_patches_loop(), but vectorized
+    masks = words >> 23
+    masks = masks[masks != 511] + 1  # skip the rejected words
+    stop = start + len(masks)
+
+    bits = (masks[:, np.newaxis] >> np.arange(8, -1, -1)) & 1
+    offsets = np.arange(3)
+    rows = xs[start:stop, np.newaxis].astype(np.intp) + 1 + np.repeat(offsets, 3)
+    cols = ys[start:stop, np.newaxis].astype(np.intp) + 1 + np.tile(offsets, 3)
+    if len(masks) and (image.shape[0] <= rows.max() or image.shape[1] <= cols.max()):
+        raise IndexError("The point is out of the image")
+
+    # The patches are drawn in order, so only the last value of a pixel is kept
+    pixels = np.ravel_multi_index((rows.ravel(), cols.ravel()), image.shape)[::-1]
+    pixels, last = np.unique(pixels, return_index=True)
+    image[np.unravel_index(pixels, image.shape)] = 127 * bits.ravel()[::-1][last]
+
+    return stop
+
+
+if njit is not None:
+    _draw_patches = njit(cache=True)(_draw_patches_loop)
+else:
+    _draw_patches = _draw_patches_np
 
 
 class IFSFunction:
     NUM_PARAMS = 6
 
     def __init__(self, rng, prev_x, prev_y):
-        self.function = []
-        self.xs, self.ys = [prev_x], [prev_y]
-        self.select_function = []
-        self.cum_proba = 0.0
+        self.transforms = np.empty((0, 2, 3), dtype=np.float64)
+        self.select_function = np.empty(0, dtype=np.float64)
+        self.xs = np.array([prev_x], dtype=np.float64)
+        self.ys = np.array([prev_y], dtype=np.float64)
         self._rng = rng
 
-    def add_param(self, params, proba, weights=None):
+    @staticmethod
+    def make_transform(a, b, c, d, e, f):
+        # (x, y) -> (a * x + b * y + e, c * x + d * y + f)
+        return ((a, b, e), (c, d, f))
+
+    def set_params(self, params: IFSParams, weights=None):
+        transforms = params.transforms.astype(np.float64)
         if weights is not None:
-            params = list(np.array(params) * np.array(weights))
+            transforms *= np.array(self.make_transform(*weights), dtype=np.float64)
 
-        self.function.append(params)
-        self.cum_proba += proba
-        self.select_function.append(self.cum_proba)
+        self.transforms = transforms
+        self.select_function = np.cumsum(params.probs, dtype=np.float64)
 
     def calculate(self, iterations):
-        prev_x, prev_y = self.xs[-1], self.ys[-1]
-        next_x, next_y = self.xs[-1], self.ys[-1]
-
-        for _ in range(iterations):
-            rand = self._rng.random()
-            for func_params, select_func in zip(self.function, self.select_function):
-                a, b, c, d, e, f = func_params
-                if rand <= select_func:
-                    next_x = prev_x * a + prev_y * b + e
-                    next_y = prev_x * c + prev_y * d + f
-                    break
-
-            self.xs.append(next_x)
-            self.ys.append(next_y)
-            prev_x = next_x
-            prev_y = next_y
+        rands = random_uniforms(self._rng, iterations)
+
+        xs, ys = _ifs_iterate(
+            self.transforms, self.select_function, rands, float(self.xs[-1]), float(self.ys[-1])
+        )
+        self.xs = np.concatenate((self.xs, xs))
+        self.ys = np.concatenate((self.ys, ys))
 
     @staticmethod
     def process_nans(data):
@@ -82,16 +232,28 @@ class IFSFunction:
         self.xs = np.uint16(xs / (xmax - xmin + 1e-5) * (image_x - 2 * pad_x) + pad_x)
         self.ys = np.uint16(ys / (ymax - ymin + 1e-5) * (image_y - 2 * pad_y) + pad_y)
 
-    def draw(self, image_x, image_y, draw_point, pad_x=6, pad_y=6):
+    def draw(self, image_x, image_y, draw_point, pad_x=6, pad_y=6, out=None):
+        """
+        Draws the points into a new image or into the 'out' array, if specified.
+        """
+
         self.rescale(image_x, image_y, pad_x, pad_y)
-        image = np.zeros((image_x, image_y), dtype=np.uint8)
-        for x, y in zip(self.xs, self.ys):
-            if draw_point:
-                image[x, y] = 127
-            else:
-                mask = "{:09b}".format(self._rng.randint(1, 511))
-                patch = 127 * np.array(list(map(int, list(mask))), dtype=np.uint8).reshape(3, 3)
-                image[x + 1 : x + 4, y + 1 : y + 4] = patch
+
+        if out is None:
+            image = np.zeros((image_x, image_y), dtype=np.uint8)
+        else:
+            assert out.shape == (image_x, image_y) and out.dtype == np.uint8
+            image = out
+            image.fill(0)
+
+        if draw_point:
+            image[self.xs, self.ys] = 127
+        else:
+            # Each point takes one rng word, a word is skipped if it is rejected
+            drawn = 0
+            while drawn < len(self.xs):
+                words = random_words(self._rng, len(self.xs) - drawn)
+                drawn = _draw_patches(image, self.xs, self.ys, words, drawn)
 
         return image
 
@@ -106,50 +268,111 @@ def rgb2lab(frame: np.ndarray) -> np.ndarray:
 
 
 def colorize(frame, net):
-    H_orig, W_orig = frame.shape[:2]
-    if len(frame.shape) == 2 or frame.shape[-1] == 1:
-        frame = np.tile(frame.reshape(H_orig, W_orig, 1), (1, 1, 3))
+    return colorize_batch([frame], net)[0]
 
-    frame = frame.astype(np.float32) / 255
-    img_l = rgb2lab(frame)  # get L from Lab image
-    img_rs = cv.resize(img_l, (224, 224))  # resize image to network input size
-    img_l_rs = img_rs - 50  # subtract 50 for mean-centering
 
-    net.setInput(cv.dnn.blobFromImage(img_l_rs))
-    ab_dec = net.forward()[0, :, :, :].transpose((1, 2, 0))
+def _resize(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    # cv.resize() just copies the image, if the size is the same
+    if image.shape[1::-1] == size:
+        return image
+    return cv.resize(image, size, interpolation=cv.INTER_LINEAR)
+
+
+def colorize_batch(frames: List[np.ndarray], net) -> List[np.ndarray]:
+    # Running the network on a batch of images is faster than doing it one by one
+    imgs_l = []
+    imgs_l_rs = []
+    for frame in frames:
+        H_orig, W_orig = frame.shape[:2]
+        if len(frame.shape) == 2 or frame.shape[-1] == 1:
+            frame = np.tile(frame.reshape(H_orig, W_orig, 1), (1, 1, 3))
+
+        frame = frame.astype(np.float32) / 255
+        img_l = rgb2lab(frame)  # get L from Lab image
+        img_rs = _resize(img_l, (224, 224))  # resize image to network input size
+        imgs_l.append(img_l)
+        imgs_l_rs.append(img_rs - 50)  # subtract 50 for mean-centering
+
+    net.setInput(cv.dnn.blobFromImages(imgs_l_rs))
+    ab_decs = net.forward()
+
+    color_frames = []
+    for img_l, ab_dec in zip(imgs_l, ab_decs):
+        H_orig, W_orig = img_l.shape[:2]
+        ab_dec = ab_dec.transpose((1, 2, 0))
+
+        ab_dec_us = _resize(ab_dec, (W_orig, H_orig))
+        img_lab_out = np.concatenate(
+            (img_l[..., np.newaxis], ab_dec_us), axis=2
+        )  # concatenate with original image L
+        img_bgr_out = np.clip(cv.cvtColor(img_lab_out, cv.COLOR_Lab2BGR), 0, 1)
+        frame_normed = (
+            255 * (img_bgr_out - img_bgr_out.min()) / (img_bgr_out.max() - img_bgr_out.min())
+        )
+        color_frames.append(np.array(frame_normed, dtype=np.uint8))
 
-    ab_dec_us = cv.resize(ab_dec, (W_orig, H_orig))
-    img_lab_out = np.concatenate(
-        (img_l[..., np.newaxis], ab_dec_us), axis=2
-    )  # concatenate with original image L
-    img_bgr_out = np.clip(cv.cvtColor(img_lab_out, cv.COLOR_Lab2BGR), 0, 1)
-    frame_normed = 255 * (img_bgr_out - img_bgr_out.min()) / (img_bgr_out.max() - img_bgr_out.min())
-    frame_normed = np.array(frame_normed, dtype=np.uint8)
-    return cv.resize(frame_normed, (W_orig, H_orig))
+    return color_frames
 
 
-def augment(rng: Random, image: np.ndarray, colors: np.ndarray) -> np.ndarray:
-    if rng.random() >= 0.5:
-        image = cv.flip(image, 1)
+@attrs(slots=True, eq=False)
+class AugmentParams:
+    flip_horizontal: bool = field()
+    flip_vertical: bool = field()
+    angle: float = field()
+    color_idx: int = field()
+    blur_size: Optional[int] = field()
+
+
+def draw_augment_params(rng: Random, num_colors: int) -> AugmentParams:
+    # The values are drawn in the same order as the augmentations are applied
+    flip_horizontal = rng.random() >= 0.5
+    flip_vertical = rng.random() >= 0.5
+    angle = rng.uniform(-30, 30)
+    color_idx = rng.randrange(num_colors)
 
-    if rng.random() >= 0.5:
+    blur_size = None
+    if rng.random() >= 0.3:
+        blur_size = rng.choice(range(3, 16, 2))
+
+    return AugmentParams(
+        flip_horizontal=flip_horizontal,
+        flip_vertical=flip_vertical,
+        angle=angle,
+        color_idx=color_idx,
+        blur_size=blur_size,
+    )
+
+
+def augment_from_params(image: np.ndarray, colors: np.ndarray, params: AugmentParams) -> np.ndarray:
+    if params.flip_horizontal and params.flip_vertical:
+        image = cv.flip(image, -1)
+    elif params.flip_horizontal:
+        image = cv.flip(image, 1)
+    elif params.flip_vertical:
         image = cv.flip(image, 0)
 
     height, width = image.shape[:2]
-    angle = rng.uniform(-30, 30)
-    rotate_matrix = cv.getRotationMatrix2D(center=(width / 2, height / 2), angle=angle, scale=1)
+    rotate_matrix = cv.getRotationMatrix2D(
+        center=(width / 2, height / 2), angle=params.angle, scale=1
+    )
     image = cv.warpAffine(src=image, M=rotate_matrix, dsize=(width, height))
 
-    image = fill_background(rng, image, colors)
-    if rng.random() >= 0.3:
-        k_size = rng.choice(list(range(3, 16, 2)))
-        image = cv.GaussianBlur(image, (k_size, k_size), 0)
+    image = _fill_background(image, colors[params.color_idx])
+    if params.blur_size is not None:
+        image = cv.GaussianBlur(image, (params.blur_size, params.blur_size), 0)
     return image
 
 
+def augment(rng: Random, image: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    return augment_from_params(image, colors, draw_augment_params(rng, len(colors)))
+
+
 def fill_background(rng: Random, image: np.ndarray, colors: np.ndarray) -> np.ndarray:
-    rows, cols = np.nonzero(~np.any(image, axis=-1))  # background color = [0, 0, 0]
-    image[rows, cols] = rng.choice(colors)
+    return _fill_background(image, colors[rng.randrange(len(colors))])
+
+
+def _fill_background(image: np.ndarray, color: np.ndarray) -> np.ndarray:
+    image[~np.any(image, axis=-1)] = color  # background color = [0, 0, 0]
     return image
 
 
@@ -125,6 +125,8 @@ def save_image(
         params["quality"] = kwargs.get("jpeg_quality")
         if kwargs.get("jpeg_quality") == 100:
             params["subsampling"] = 0
+        if kwargs.get("png_compression") is not None:
+            params["compress_level"] = kwargs["png_compression"]
 
         image = image.astype(dtype)
         if len(image.shape) == 3 and image.shape[2] in {3, 4}:
@@ -151,6 +153,8 @@ def encode_image(image: np.ndarray, ext: str, dtype: DTypeLike = np.uint8, **kwa
 
         if ext.upper() == ".JPG":
             params = [int(cv2.IMWRITE_JPEG_QUALITY), kwargs.get("jpeg_quality", 75)]
+        elif ext.upper() == ".PNG" and kwargs.get("png_compression") is not None:
+            params = [int(cv2.IMWRITE_PNG_COMPRESSION), kwargs["png_compression"]]
 
         image = image.astype(dtype)
         success, result = cv2.imencode(ext, image, params=params)
@@ -167,6 +171,8 @@ def encode_image(image: np.ndarray, ext: str, dtype: DTypeLike = np.uint8, **kwa
         params["quality"] = kwargs.get("jpeg_quality")
         if kwargs.get("jpeg_quality") == 100:
             params["subsampling"] = 0
+        if kwargs.get("png_compression") is not None:
+            params["compress_level"] = kwargs["png_compression"]
 
         image = image.astype(dtype)
         if len(image.shape) == 3 and image.shape[2] in {3, 4}:
@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: MIT
 
 from collections import OrderedDict
+from threading import Lock
 
 _instance = None
 
@@ -21,22 +22,28 @@ class ImageCache:
         self.capacity = int(capacity)
         self.items = OrderedDict()
 
+        # Images can be loaded from several threads, e.g. when media is saved
+        self._lock = Lock()
+
     def push(self, item_id, image):
-        if self.capacity <= len(self.items):
-            self.items.popitem(last=True)
-        self.items[item_id] = image
+        with self._lock:
+            if self.capacity <= len(self.items):
+                self.items.popitem(last=True)
+            self.items[item_id] = image
 
     def get(self, item_id):
-        default = object()
-        item = self.items.get(item_id, default)
-        if item is default:
-            return None
+        with self._lock:
+            default = object()
+            item = self.items.get(item_id, default)
+            if item is default:
+                return None
 
-        self.items.move_to_end(item_id, last=False)  # naive splay tree
-        return item
+            self.items.move_to_end(item_id, last=False)  # naive splay tree
+            return item
 
     def size(self):
         return len(self.items)
 
     def clear(self):
-        self.items.clear()
+        with self._lock:
+            self.items.clear()
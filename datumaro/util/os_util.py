@@ -7,9 +7,11 @@ import os
 import os.path as osp
 import re
 import shutil
+import stat
 import subprocess  # nosec B404
 import sys
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack, contextmanager, redirect_stderr, redirect_stdout
 from io import StringIO
 from typing import Iterable, Iterator, Optional, Union
@@ -146,6 +148,114 @@ def copytree(src, dst):
         ) from e
 
 
+def copyfile(src, dst):
+    # Serves as a replacement for shutil.copyfile().
+    #
+    # Since 3.8, shutil uses platform-specific zero-copy calls
+    # (like sendfile() on Linux), pre 3.8 the data is copied through
+    # the user space buffers
+    # https://docs.python.org/3/library/shutil.html#platform-dependent-efficient-copy-operations
+
+    if sys.version_info >= (3, 8):
+        shutil.copyfile(src, dst)
+        return
+
+    BLOCK_SIZE = 2**20
+
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        if hasattr(os, "sendfile"):
+            try:
+                size = os.fstat(src_file.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(
+                        dst_file.fileno(), src_file.fileno(), offset, min(size - offset, 2**30)
+                    )
+                    if not sent:
+                        break
+                    offset += sent
+                else:
+                    return
+            except OSError:
+                # sendfile() can be unsupported for the file types or the platform
+                pass
+
+            src_file.seek(0)
+            dst_file.seek(0)
+            dst_file.truncate()
+
+        shutil.copyfileobj(src_file, dst_file, BLOCK_SIZE)
+
+
+def _is_link(entry: os.DirEntry) -> bool:
+    if entry.is_symlink():
+        return True
+
+    if sys.platform == "win32":
+        # Directory junctions are not reported as symlinks.
+        # On Windows, DirEntry provides the file attributes without extra calls.
+        attrs = entry.stat(follow_symlinks=False).st_file_attributes
+        return bool(attrs & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+
+    return False
+
+
+def _remove_files(paths: Iterable[str]) -> None:
+    # rmfile() from GitPython skips anything but regular files, like FIFOs
+    # and sockets, so the parent directory couldn't be removed then
+    for path in paths:
+        if sys.platform == "win32":
+            # Read-only files can't be removed on Windows
+            os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+
+
+def fast_rmtree(root: str, *, max_workers: int = 8, batch_size: int = 256) -> None:
+    # Serves as a faster replacement for rmtree() for directories with
+    # many small files.
+    #
+    # Removal of such directories is dominated by the unlink() syscalls,
+    # which release the GIL. The directories are scanned in the calling thread,
+    # and the files are removed in batches in a thread pool.
+    # DirEntry allows to avoid extra stat() calls.
+
+    if osp.islink(root):
+        raise OSError("Cannot call rmtree on a symbolic link")
+
+    dirs = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        batch = []
+
+        stack = [root]
+        while stack:
+            dirpath = stack.pop()
+            dirs.append(dirpath)
+
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if _is_link(entry):
+                        # The link target must not be touched
+                        os.unlink(entry.path)
+                    elif entry.is_dir():
+                        stack.append(entry.path)
+                    else:
+                        batch.append(entry.path)
+                        if batch_size <= len(batch):
+                            futures.append(executor.submit(_remove_files, batch))
+                            batch = []
+
+        if batch:
+            futures.append(executor.submit(_remove_files, batch))
+
+        for future in futures:
+            future.result()
+
+    # Parents are visited before children
+    for dirpath in reversed(dirs):
+        os.rmdir(dirpath)
+
+
 @contextmanager
 def suppress_output(stdout: bool = True, stderr: bool = False):
     with open(os.devnull, "w") as devnull, ExitStack() as es:
@@ -1,16 +1,67 @@
+import hashlib
 import os
 import os.path as osp
+import tarfile
+from random import Random
+from threading import Thread
 from unittest import TestCase
 
+import cv2 as cv
 import numpy as np
+import requests
 
 from datumaro.plugins.synthetic_data import FractalImageGenerator
+from datumaro.plugins.synthetic_data.image_generator import (
+    _AsyncFileWriter,
+    _check_hull_points_file,
+    _TarShardWriter,
+)
+from datumaro.plugins.synthetic_data.utils import (
+    IFSFunction,
+    _draw_patches_loop,
+    _draw_patches_np,
+    _ifs_iterate_loop,
+    _ifs_iterate_py,
+    random_uniforms,
+    random_words,
+)
 from datumaro.util.image import load_image
 from datumaro.util.test_utils import TestDir
 
 from .requirements import Requirements, mark_requirement
 
 
+class _NoDownloadFractalImageGenerator(FractalImageGenerator):
+    @classmethod
+    def _download_colorization_model(cls, save_dir):
+        pass
+
+
+class _FakeResponse:
+    def __init__(self, data, status_error=None):
+        self._data = data
+        self._status_error = status_error
+
+    def raise_for_status(self):
+        if self._status_error:
+            raise self._status_error
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._data), chunk_size):
+            yield self._data[i : i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, response):
+        self._response = response
+
+    def get(self, url, **kwargs):
+        return self._response
+
+
 class FractalImageGeneratorTest(TestCase):
     @mark_requirement(Requirements.DATUM_677)
     def test_save_image_can_create_dir(self):
@@ -41,3 +92,333 @@ class FractalImageGeneratorTest(TestCase):
                 actual = load_image(osp.join(test_dir, filename))
                 expected = load_image(osp.join(ref_dir, filename))
                 np.testing.assert_array_equal(actual, expected)
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_report_model_loading_error(self):
+        with TestDir() as test_dir:
+            model_dir = osp.join(test_dir, "model")
+            os.makedirs(model_dir)
+            for filename in [
+                FractalImageGenerator._MODEL_PROTO_FILENAME,
+                FractalImageGenerator._MODEL_WEIGHTS_FILENAME,
+            ]:
+                with open(osp.join(model_dir, filename), "w") as f:
+                    f.write("not a model")
+            np.save(
+                osp.join(model_dir, FractalImageGenerator._HULL_PTS_FILE_NAME),
+                np.zeros((313, 2)),
+            )
+
+            output_dir = osp.join(test_dir, "output")
+            generator = _NoDownloadFractalImageGenerator(
+                output_dir, 3, shape=[24, 36], model_path=model_dir
+            )
+
+            # The worker initialization error must not make the generation hang
+            with self.assertRaises(cv.error):
+                generator.generate_dataset()
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_pack_images_to_tar(self):
+        ref_dir = osp.join(osp.dirname(__file__), "assets", "synthetic_dataset", "images")
+        with TestDir() as test_dir:
+            dataset_size = 3
+            FractalImageGenerator(
+                test_dir, dataset_size, shape=[24, 36], emit_tar=True
+            ).generate_dataset()
+            shard_names = os.listdir(test_dir)
+            self.assertTrue(shard_names)
+            for shard_name in shard_names:
+                self.assertRegex(shard_name, r"^shard-\d{4}-\d{4}\.tar$")
+
+                with tarfile.open(osp.join(test_dir, shard_name)) as tar:
+                    tar.extractall(test_dir)
+                os.remove(osp.join(test_dir, shard_name))
+
+            image_files = os.listdir(test_dir)
+            self.assertEqual(len(image_files), dataset_size)
+
+            for filename in image_files:
+                actual = load_image(osp.join(test_dir, filename))
+                expected = load_image(osp.join(ref_dir, filename))
+                np.testing.assert_array_equal(actual, expected)
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_detect_incomplete_model_file(self):
+        with TestDir() as test_dir:
+            data = b"model data"
+            checksum = hashlib.sha512(data).hexdigest()
+            path = osp.join(test_dir, "model")
+
+            with open(path, "wb") as f:
+                f.write(data)
+            self.assertTrue(
+                FractalImageGenerator._check_file(
+                    path, expected_size=len(data), expected_checksum=checksum
+                )
+            )
+
+            with open(path, "wb") as f:
+                f.write(data[:-1])
+            self.assertFalse(
+                FractalImageGenerator._check_file(
+                    path, expected_size=len(data), expected_checksum=checksum
+                )
+            )
+
+            with open(path, "wb") as f:
+                f.write(b"corrupted!")
+            self.assertFalse(
+                FractalImageGenerator._check_file(
+                    path, expected_size=len(data), expected_checksum=checksum
+                )
+            )
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_skip_missing_ir_model(self):
+        with TestDir() as test_dir:
+            self.assertIsNone(FractalImageGenerator._load_colorization_model_ir(test_dir))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_fall_back_from_unreadable_ir_model(self):
+        with TestDir() as test_dir:
+            for filename in [
+                FractalImageGenerator._MODEL_IR_XML_FILENAME,
+                FractalImageGenerator._MODEL_IR_BIN_FILENAME,
+            ]:
+                with open(osp.join(test_dir, filename), "w") as f:
+                    f.write("not a model")
+
+            with self.assertLogs(level="WARNING") as logs:
+                net = FractalImageGenerator._load_colorization_model_ir(test_dir)
+
+            self.assertIsNone(net)
+            self.assertEqual(1, len(logs.records))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_async_writer_keeps_file_order(self):
+        written = []
+
+        with _AsyncFileWriter(lambda *args: written.append(args), max_pending=2) as writer:
+            for i in range(10):
+                writer.write(str(i), b"%d" % i)
+
+        self.assertEqual([(str(i), b"%d" % i) for i in range(10)], written)
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_async_writer_can_report_write_error(self):
+        def write_file(filename, data):
+            raise ValueError(filename)
+
+        errors = []
+
+        def produce():
+            try:
+                with _AsyncFileWriter(write_file, max_pending=1) as writer:
+                    for i in range(100):
+                        writer.write(str(i), b"")
+            except ValueError as e:
+                errors.append(e)
+
+        # The producer must not be blocked by the queue of the failed writer
+        producer = Thread(target=produce, daemon=True)
+        producer.start()
+        producer.join(timeout=10)
+
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(1, len(errors))
+        self.assertEqual("0", str(errors[0]))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_async_writer_can_report_error_on_close(self):
+        def write_file(filename, data):
+            raise ValueError(filename)
+
+        writer = _AsyncFileWriter(write_file)
+        writer.write("a", b"")
+
+        with self.assertRaisesRegex(ValueError, "a"):
+            writer.close()
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_tar_writer_can_split_files_to_shards(self):
+        with TestDir() as test_dir:
+            with _TarShardWriter(test_dir, 2, name_prefix="shard-0001") as writer:
+                for i in range(5):
+                    writer.write("%d.png" % i, b"%d" % i)
+
+            self.assertEqual(
+                ["shard-0001-0000.tar", "shard-0001-0001.tar", "shard-0001-0002.tar"],
+                sorted(os.listdir(test_dir)),
+            )
+
+            files = []
+            for shard_name in sorted(os.listdir(test_dir)):
+                with tarfile.open(osp.join(test_dir, shard_name)) as shard:
+                    files.append(
+                        [(m.name, shard.extractfile(m).read()) for m in shard.getmembers()]
+                    )
+
+            self.assertEqual(
+                [
+                    [("0.png", b"0"), ("1.png", b"1")],
+                    [("2.png", b"2"), ("3.png", b"3")],
+                    [("4.png", b"4")],
+                ],
+                files,
+            )
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_cant_generate_with_unreadable_ir_model_only(self):
+        with TestDir() as test_dir:
+            model_dir = osp.join(test_dir, "model")
+            os.makedirs(model_dir)
+            for filename in [
+                FractalImageGenerator._MODEL_IR_XML_FILENAME,
+                FractalImageGenerator._MODEL_IR_BIN_FILENAME,
+            ]:
+                with open(osp.join(model_dir, filename), "w") as f:
+                    f.write("not a model")
+
+            output_dir = osp.join(test_dir, "output")
+            generator = FractalImageGenerator(output_dir, 3, shape=[24, 36], model_path=model_dir)
+
+            # The Caffe model is not downloaded when there is an IR model,
+            # and the IR loading error in the workers is reported
+            with self.assertRaisesRegex(ValueError, "no Caffe model"):
+                generator.generate_dataset()
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_replace_model_file_on_download(self):
+        with TestDir() as test_dir:
+            data = b"model data"
+            path = osp.join(test_dir, "model")
+            with open(path, "wb") as f:
+                f.write(b"corrupted!")
+
+            FractalImageGenerator._download_file(
+                "url",
+                path,
+                session=_FakeSession(_FakeResponse(data)),
+                expected_size=len(data),
+                expected_checksum=hashlib.sha512(data).hexdigest(),
+            )
+
+            with open(path, "rb") as f:
+                self.assertEqual(data, f.read())
+            self.assertEqual(["model"], os.listdir(test_dir))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_keep_model_file_on_failed_download(self):
+        data = b"model data"
+        for response in [
+            _FakeResponse(data, status_error=requests.HTTPError("404")),
+            _FakeResponse(b"wrong data"),
+        ]:
+            with self.subTest(response=response), TestDir() as test_dir:
+                path = osp.join(test_dir, "model")
+                with open(path, "wb") as f:
+                    f.write(b"old model")
+
+                with self.assertRaises(Exception):
+                    FractalImageGenerator._download_file(
+                        "url",
+                        path,
+                        session=_FakeSession(response),
+                        expected_size=len(data),
+                        expected_checksum=hashlib.sha512(data).hexdigest(),
+                    )
+
+                with open(path, "rb") as f:
+                    self.assertEqual(b"old model", f.read())
+                self.assertEqual(["model"], os.listdir(test_dir))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_can_check_hull_points_file(self):
+        with TestDir() as test_dir:
+            path = osp.join(test_dir, "pts_in_hull.npy")
+
+            # The file can be saved by any NumPy version
+            np.save(path, np.zeros((313, 2), dtype=np.int64))
+            self.assertTrue(_check_hull_points_file(path))
+
+            np.save(path, np.zeros((312, 2), dtype=np.int64))
+            self.assertFalse(_check_hull_points_file(path))
+
+            with open(path, "wb") as f:
+                f.write(b"corrupted!")
+            self.assertFalse(_check_hull_points_file(path))
+
+    @mark_requirement(Requirements.DATUM_677)
+    def test_random_uniforms_reproduce_python_random(self):
+        expected_rng = Random(42)
+        actual_rng = Random(42)
+
+        expected = [expected_rng.random() for _ in range(1000)]
+        actual = random_uniforms(actual_rng, 1000)
+
+        np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(actual_rng.getstate(), expected_rng.getstate())
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_random_words_reproduce_python_random(self):
+        expected_rng = Random(42)
+        actual_rng = Random(42)
+
+        expected = [expected_rng.getrandbits(32) for _ in range(1000)]
+        actual = random_words(actual_rng, 1000)
+
+        np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(actual_rng.getstate(), expected_rng.getstate())
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_can_draw_patches_into_buffer(self):
+        height, width = 40, 52
+        points_rng = Random(0)
+        xs = [points_rng.uniform(-1, 1) for _ in range(2000)]
+        ys = [points_rng.uniform(-1, 1) for _ in range(2000)]
+
+        expected_rng = Random(42)
+        expected_function = IFSFunction(expected_rng, prev_x=0.0, prev_y=0.0)
+        expected_function.xs, expected_function.ys = np.array(xs), np.array(ys)
+        expected_function.rescale(height, width, 6, 6)
+        expected = np.zeros((height, width), dtype=np.uint8)
+        for x, y in zip(expected_function.xs, expected_function.ys):
+            mask = [int(b) for b in "{:09b}".format(expected_rng.randint(1, 511))]
+            expected[x + 1 : x + 4, y + 1 : y + 4] = 127 * np.array(mask).reshape(3, 3)
+
+        actual_rng = Random(42)
+        actual_function = IFSFunction(actual_rng, prev_x=0.0, prev_y=0.0)
+        actual_function.xs, actual_function.ys = np.array(xs), np.array(ys)
+        out = np.full((height, width), 255, dtype=np.uint8)
+        actual = actual_function.draw(height, width, draw_point=False, out=out)
+
+        self.assertIs(actual, out)
+        np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(actual_rng.getstate(), expected_rng.getstate())
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_kernel_fallbacks_match_reference_loops(self):
+        rng = np.random.default_rng(0)
+
+        transforms = rng.uniform(-1, 1, (4, 2, 3))
+        cum_proba = np.cumsum(rng.uniform(0, 1, 4))
+        cum_proba /= cum_proba[-1] * 1.1  # some values don't select a function
+        rands = rng.random(2000)
+        for expected, actual in zip(
+            _ifs_iterate_loop(transforms, cum_proba, rands, 0.0, 0.0),
+            _ifs_iterate_py(transforms, cum_proba, rands, 0.0, 0.0),
+        ):
+            np.testing.assert_array_equal(actual, expected)
+
+        xs = rng.integers(0, 10, 500).astype(np.uint16)
+        ys = rng.integers(0, 12, 500).astype(np.uint16)
+        words = rng.integers(0, 2**32, 500, dtype=np.uint64).astype(np.uint32)
+        words[::7] = 0xFFFFFFFF  # rejected words
+        expected = np.zeros((13, 15), dtype=np.uint8)
+        actual = np.zeros((13, 15), dtype=np.uint8)
+        self.assertEqual(
+            _draw_patches_np(actual, xs, ys, words, 3),
+            _draw_patches_loop(expected, xs, ys, words, 3),
+        )
+        np.testing.assert_array_equal(actual, expected)
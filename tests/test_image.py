@@ -59,6 +59,37 @@ class ImageOperationsTest(TestCase):
                 "save: %s, load: %s" % (save_backend, load_backend),
             )
 
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_save_and_load_png_with_compression_level(self):
+        backends = image_module._IMAGE_BACKENDS
+        for save_backend, png_compression in product(backends, [0, 1, 9]):
+            with TestDir() as test_dir:
+                src_image = np.random.randint(0, 255 + 1, (2, 4, 3))
+                path = osp.join(test_dir, "img.png")
+
+                image_module._IMAGE_BACKEND = save_backend
+                image_module.save_image(path, src_image, png_compression=png_compression)
+
+                dst_image = image_module.load_image(path)
+
+                self.assertTrue(
+                    np.array_equal(src_image, dst_image),
+                    "save: %s, compression: %s" % (save_backend, png_compression),
+                )
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_png_compression_level_affects_encoded_size(self):
+        # A smooth gradient is well compressible
+        src_image = np.tile(np.arange(256, dtype=np.uint8), (64, 1))
+        src_image = np.dstack([src_image] * 3)
+
+        for backend in image_module._IMAGE_BACKENDS:
+            image_module._IMAGE_BACKEND = backend
+            fast_size = len(image_module.encode_image(src_image, ".png", png_compression=0))
+            small_size = len(image_module.encode_image(src_image, ".png", png_compression=9))
+
+            self.assertLess(small_size, fast_size, "backend: %s" % backend)
+
     @mark_requirement(Requirements.DATUM_GENERAL_REQ)
     def test_save_image_to_inexistent_dir_raises_error(self):
         with self.assertRaises(FileNotFoundError):
@@ -1,7 +1,11 @@
+import time
+from functools import partial
 from unittest import TestCase
 
 import numpy as np
 
+from datumaro.components.converter import ExportErrorPolicy
+from datumaro.components.errors import ItemExportError
 from datumaro.components.extractor import DatasetItem
 from datumaro.components.media import Image
 from datumaro.components.project import Dataset
@@ -31,6 +35,70 @@ class ImageDirFormatTest(TestCase):
                 require_media=True,
             )
 
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_can_save_images_in_several_threads(self):
+        dataset = Dataset.from_iterable(
+            [DatasetItem(id=i, media=Image(data=np.ones((10, 6, 3)) * i)) for i in range(20)]
+        )
+
+        with TestDir() as test_dir:
+            check_save_and_load(
+                self,
+                dataset,
+                partial(ImageDirConverter.convert, save_images_workers=4),
+                test_dir,
+                importer="image_dir",
+                require_media=True,
+            )
+
+    @mark_requirement(Requirements.DATUM_ERROR_REPORTING)
+    def test_can_report_errors_in_item_order_when_saving_in_threads(self):
+        def make_image(i):
+            def load_image(_):
+                if i == 0:
+                    # The errors of the later items must not be reported first
+                    time.sleep(0.1)
+                raise Exception("Can't load image %s" % i)
+
+            if i % 3 != 0:
+                return Image(data=np.ones((10, 6, 3)) * i)
+            return Image(data=load_image, path="%s.jpg" % i)
+
+        dataset = Dataset.from_iterable([DatasetItem(id=i, media=make_image(i)) for i in range(20)])
+
+        class TestErrorPolicy(ExportErrorPolicy):
+            def __init__(self):
+                self.errors = []
+
+            def _handle_item_error(self, error):
+                self.errors.append(error)
+
+        with self.subTest(policy="failing"), TestDir() as test_dir:
+            with self.assertRaises(ItemExportError) as capture:
+                dataset.export(test_dir, ImageDirConverter, save_media=True, save_images_workers=4)
+            self.assertEqual(("0", "default"), capture.exception.item_id)
+
+        with self.subTest(policy="collecting"), TestDir() as test_dir:
+            error_policy = TestErrorPolicy()
+            dataset.export(
+                test_dir,
+                ImageDirConverter,
+                save_media=True,
+                save_images_workers=4,
+                error_policy=error_policy,
+            )
+            self.assertEqual(
+                [(str(i), "default") for i in range(0, 20, 3)],
+                [e.item_id for e in error_policy.errors],
+            )
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_can_parse_num_workers_option(self):
+        args = ImageDirConverter.parse_cmdline(["--num-workers", "3", "--save-image"])
+
+        self.assertEqual(args["save_images_workers"], 3)
+        self.assertTrue(args["save_images"])
+
     @mark_requirement(Requirements.DATUM_GENERAL_REQ)
     def test_relative_paths(self):
         dataset = Dataset.from_iterable(
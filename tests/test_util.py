@@ -1,10 +1,11 @@
 import os
 import os.path as osp
+import sys
 from contextlib import suppress
-from unittest import TestCase, mock
+from unittest import TestCase, mock, skipIf
 
 from datumaro.util import is_method_redefined
-from datumaro.util.os_util import walk
+from datumaro.util.os_util import copyfile, fast_rmtree, walk
 from datumaro.util.scope import Scope, on_error_do, on_exit_do, scoped
 from datumaro.util.test_utils import TestDir
 
@@ -160,6 +161,74 @@ class TestOsUtils(TestCase):
                 visited,
             )
 
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_can_copy_file(self):
+        for version_info in [sys.version_info, (3, 7)]:
+            with TestDir() as test_dir, mock.patch.object(sys, "version_info", version_info):
+                src_path = osp.join(test_dir, "src")
+                dst_path = osp.join(test_dir, "dst")
+                data = os.urandom(3 * 2**20 + 5)
+                with open(src_path, "wb") as f:
+                    f.write(data)
+
+                copyfile(src_path, dst_path)
+
+                with open(dst_path, "rb") as f:
+                    self.assertEqual(data, f.read(), version_info)
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_can_remove_tree_quickly(self):
+        with TestDir() as test_dir:
+            outside_dir = osp.join(test_dir, "outside")
+            os.makedirs(outside_dir)
+            with open(osp.join(outside_dir, "file.txt"), "w") as f:
+                f.write("x")
+
+            root = osp.join(test_dir, "root")
+            for i in range(3):
+                subdir = osp.join(root, *(["d%s" % j for j in range(i + 1)]))
+                os.makedirs(subdir)
+                for j in range(10):
+                    with open(osp.join(subdir, "f%s.txt" % j), "w") as f:
+                        f.write("x")
+            os.symlink(outside_dir, osp.join(root, "d0", "link"), target_is_directory=True)
+
+            fast_rmtree(root, batch_size=4)
+
+            self.assertFalse(osp.exists(root))
+            self.assertTrue(osp.isfile(osp.join(outside_dir, "file.txt")))
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    @skipIf(not hasattr(os, "mkfifo"), reason="FIFOs are not supported")
+    def test_can_remove_tree_with_special_files(self):
+        with TestDir() as test_dir:
+            root = osp.join(test_dir, "root")
+            os.makedirs(osp.join(root, "d"))
+            os.mkfifo(osp.join(root, "d", "fifo"))
+            with open(osp.join(root, "d", "readonly.txt"), "w") as f:
+                f.write("x")
+            os.chmod(osp.join(root, "d", "readonly.txt"), 0o444)
+
+            fast_rmtree(root)
+
+            self.assertFalse(osp.exists(root))
+
+    @mark_requirement(Requirements.DATUM_GENERAL_REQ)
+    def test_cant_remove_tree_by_symlink(self):
+        with TestDir() as test_dir:
+            target_dir = osp.join(test_dir, "target")
+            os.makedirs(target_dir)
+            with open(osp.join(target_dir, "file.txt"), "w") as f:
+                f.write("x")
+
+            link = osp.join(test_dir, "link")
+            os.symlink(target_dir, link, target_is_directory=True)
+
+            with self.assertRaises(OSError):
+                fast_rmtree(link)
+
+            self.assertTrue(osp.isfile(osp.join(target_dir, "file.txt")))
+
 
 class TestMemberRedefined(TestCase):
     class Base: